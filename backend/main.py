@@ -9,15 +9,17 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, List
 
-from regions import SUPPORTED_REGIONS
-from search_service import build_search_body, get_client, parse_response, search
-from tags_store import create_tag, delete_tag, get_tags
-
-# Load .env from project root (parent of backend/)
+# Load .env from project root (parent of backend/) before the local modules read their settings at import
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
+from query_understanding import warmup as warmup_query_understanding  # noqa: E402
+from regions import SUPPORTED_REGIONS  # noqa: E402
+from search_service import build_search_body, get_client, parse_response, search  # noqa: E402
+from tags_store import create_tag, delete_tag, get_tags  # noqa: E402
+
 OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "https://localhost:9201")
 OPENSEARCH_USER = os.getenv("OPENSEARCH_USER", "admin")
 OPENSEARCH_PASSWORD = os.getenv(
@@ -29,7 +31,11 @@ OPENSEARCH_PASSWORD = os.getenv(
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.opensearch = get_client(OPENSEARCH_HOST, OPENSEARCH_USER, OPENSEARCH_PASSWORD) if OPENSEARCH_PASSWORD else None
+    # Load spaCy before accepting traffic instead of stalling the first search
+    warmup_query_understanding()
     yield
+    if app.state.opensearch is not None:
+        await app.state.opensearch.close()
     app.state.opensearch = None
 
 
@@ -72,24 +78,27 @@ class CreateTagRequest(BaseModel):
 
 
 # --- Endpoints ---
+# Return types are declared so FastAPI serializes responses straight to JSON bytes with Pydantic
 
 @app.get("/health")
-def health():
+def health() -> dict:
     return {"status": "ok"}
 
 
 @app.get("/regions")
-def get_regions():
+def get_regions() -> dict:
     """Return supported regions for multi-country search (id, label, locale, index_suffix)."""
     return {"regions": SUPPORTED_REGIONS}
 
 
 @app.post("/search")
-def post_search(req: SearchRequest):
+async def post_search(req: SearchRequest) -> dict:
     if not app.state.opensearch:
         raise HTTPException(status_code=503, detail="OpenSearch not configured")
     f = req.filters or SearchFilters()
-    body = build_search_body(
+    # Query understanding may run spaCy (CPU-bound); keep it off the event loop
+    body = await run_in_threadpool(
+        build_search_body,
         query=req.query,
         industry=f.industry,
         size_range=f.size_range,
@@ -102,7 +111,7 @@ def post_search(req: SearchRequest):
         sort=req.sort,
         country_scope=req.country_scope,
     )
-    resp = search(
+    resp = await search(
         app.state.opensearch,
         body,
         country_scope=req.country_scope,
@@ -112,23 +121,31 @@ def post_search(req: SearchRequest):
 
 
 @app.get("/tags/{user_id}")
-def list_tags(user_id: str):
-    return {"tags": get_tags(user_id)}
+async def list_tags(user_id: str) -> dict:
+    return {"tags": await get_tags(user_id)}
 
 
 @app.post("/tags/{user_id}")
-def add_tag(user_id: str, body: CreateTagRequest):
-    tag = create_tag(user_id, body.name, body.filter_snapshot)
+async def add_tag(user_id: str, body: CreateTagRequest) -> dict:
+    tag = await create_tag(user_id, body.name, body.filter_snapshot)
     return tag
 
 
 @app.delete("/tags/{user_id}/{tag_id}")
-def remove_tag(user_id: str, tag_id: str):
-    if not delete_tag(user_id, tag_id):
+async def remove_tag(user_id: str, tag_id: str) -> dict:
+    if not await delete_tag(user_id, tag_id):
         raise HTTPException(status_code=404, detail="Tag not found")
     return {"ok": True}
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Several worker processes so CPU-bound query parsing in one does not stall the others
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("UVICORN_WORKERS", "4")),
+        loop="uvloop",
+        http="httptools",
+    )
@@ -9,70 +9,102 @@ Requires:
   python -m spacy download en_core_web_sm
 """
 import re
+from functools import lru_cache
 from typing import Optional
 
 # Semantic matching: user terms -> phrases that appear in the index (e.g. "information technology and services")
 # So "software" matches docs with industry "information technology and services" or "computer software"
 INDUSTRY_EXPANSION = {
-    "tech": ["technology", "software", "information technology", "information technology and services", "computer", "it services", "computer software"],
-    "technology": ["technology", "software", "information technology", "information technology and services", "computer", "computer software"],
-    "software": ["software", "information technology", "information technology and services", "computer software", "it services"],
-    "it": ["information technology", "information technology and services", "it services", "computer", "computer software"],
-    "fintech": ["financial", "fintech", "banking", "financial services"],
-    "finance": ["financial", "finance", "banking", "investment"],
-    "healthcare": ["healthcare", "hospital", "medical", "health"],
-    "health": ["healthcare", "health", "medical"],
-    "retail": ["retail", "consumer", "e-commerce", "ecommerce"],
-    "manufacturing": ["manufacturing", "industrial", "production"],
-    "consulting": ["consulting", "professional services", "business services"],
-    "education": ["education", "e-learning", "edtech", "training"],
-    "media": ["media", "entertainment", "publishing", "broadcast"],
-    "real estate": ["real estate", "real estate development", "property"],
-    "energy": ["energy", "oil", "gas", "renewable", "utilities"],
-    "transport": ["transport", "transportation", "logistics", "shipping"],
-    "food": ["food", "restaurant", "food & beverage", "hospitality"],
-    "marketing": ["marketing", "advertising", "market research"],
-    "hr": ["human resources", "hr", "staffing", "recruiting"],
-    "recruiting": ["recruiting", "staffing", "human resources", "talent"],
+    "tech": ("technology", "software", "information technology", "information technology and services", "computer", "it services", "computer software"),
+    "technology": ("technology", "software", "information technology", "information technology and services", "computer", "computer software"),
+    "software": ("software", "information technology", "information technology and services", "computer software", "it services"),
+    "it": ("information technology", "information technology and services", "it services", "computer", "computer software"),
+    "fintech": ("financial", "fintech", "banking", "financial services"),
+    "finance": ("financial", "finance", "banking", "investment"),
+    "healthcare": ("healthcare", "hospital", "medical", "health"),
+    "health": ("healthcare", "health", "medical"),
+    "retail": ("retail", "consumer", "e-commerce", "ecommerce"),
+    "manufacturing": ("manufacturing", "industrial", "production"),
+    "consulting": ("consulting", "professional services", "business services"),
+    "education": ("education", "e-learning", "edtech", "training"),
+    "media": ("media", "entertainment", "publishing", "broadcast"),
+    "real estate": ("real estate", "real estate development", "property"),
+    "energy": ("energy", "oil", "gas", "renewable", "utilities"),
+    "transport": ("transport", "transportation", "logistics", "shipping"),
+    "food": ("food", "restaurant", "food & beverage", "hospitality"),
+    "marketing": ("marketing", "advertising", "market research"),
+    "hr": ("human resources", "hr", "staffing", "recruiting"),
+    "recruiting": ("recruiting", "staffing", "human resources", "talent"),
+}
+
+# Term -> keywords lookup including naive plurals ("fintechs"); exact terms take precedence over plurals.
+# Values are shared tuples, so callers can't mutate the table.
+_INDUSTRY_ALL = {
+    **{term + "s": keywords for term, keywords in INDUSTRY_EXPANSION.items()},
+    **INDUSTRY_EXPANSION,
 }
 
 # spaCy NER labels we treat as location (GPE=geo-political, LOC=location, FAC=facility)
-LOCATION_ENTITY_LABELS = ("GPE", "LOC", "FAC")
+LOCATION_ENTITY_LABELS = frozenset(("GPE", "LOC", "FAC"))
+
+# "<industry> companies [in <place>]" (applied to the lowercased query)
+_COMPANIES_RE = re.compile(r"^(.+?)\s+companies?(?:\s+in\s+(.+))?$")
+
+# Noun-chunk roots that are never an industry hint
+_NOUN_CHUNK_SKIP = frozenset(("company", "companies", "california", "india", "new york", "york"))
+
+# Components understand_query needs: ner for ents, tagger + attribute_ruler + lemmatizer for lemma_,
+# parser for noun_chunks (tok2vec feeds tagger/parser). Anything else the model ships is disabled.
+SPACY_PIPES = ("tok2vec", "tagger", "attribute_ruler", "lemmatizer", "parser", "ner")
 
 _nlp = None
 
 
 def _get_nlp():
-    """Lazy-load spaCy model (en_core_web_sm). Returns None if not installed."""
+    """Lazy-load spaCy model (en_core_web_sm) with only SPACY_PIPES enabled. Returns None if not installed."""
     global _nlp
     if _nlp is not None:
         return _nlp
     try:
         import spacy
-        _nlp = spacy.load("en_core_web_sm")
+        # senter is disabled by default and redundant with parser; don't even load its weights
+        _nlp = spacy.load("en_core_web_sm", exclude=["senter"])
+        _nlp.select_pipes(enable=[p for p in _nlp.pipe_names if p in SPACY_PIPES])
         return _nlp
     except Exception:
         _nlp = False  # mark as attempted
         return None
 
 
+def warmup() -> bool:
+    """Load the spaCy model and run it once, so the first real query doesn't pay for it.
+    Returns False if spaCy or the model is not installed.
+    """
+    nlp = _get_nlp()
+    if not nlp:
+        return False
+    nlp("software companies in california")
+    return True
+
+
 def _normalize(s: str) -> str:
     return (s or "").strip().lower()
 
 
-def _expand_industry(user_term: str) -> list:
-    """Map a user industry term to a list of keywords to match on the industry field."""
+def _known_industry(user_term: str) -> Optional[tuple]:
+    """Return INDUSTRY_EXPANSION keywords for a term (or its plural), or None if the term is unknown."""
+    return _INDUSTRY_ALL.get(_normalize(user_term))
+
+
+def _expand_industry(user_term: str) -> tuple:
+    """Map a user industry term to the keywords to match on the industry field (read-only tuple)."""
     t = _normalize(user_term)
     if not t:
-        return []
-    if t in INDUSTRY_EXPANSION:
-        return list(INDUSTRY_EXPANSION[t])
-    if t.endswith("s") and t[:-1] in INDUSTRY_EXPANSION:
-        return list(INDUSTRY_EXPANSION[t[:-1]])
-    return [t]
+        return ()
+    return _INDUSTRY_ALL.get(t) or (t,)
 
 
-def understand_query(query: Optional[str]) -> dict:
+def understand_query(query: Optional[str], q_lower: Optional[str] = None) -> dict:
     """
     Parse a query like "tech companies in california" into structured filters using spaCy.
     Uses NER for locations (GPE, LOC, FAC) and lemmatization + INDUSTRY_EXPANSION for industry.
@@ -81,18 +113,96 @@ def understand_query(query: Optional[str]) -> dict:
       - location: string to match on locality/country, or None
       - residual_query: remaining query for free-text, or None
 
-    If spaCy is not installed, returns empty filters. Install with:
+    "<known industry> companies in <place>" is answered by regex alone; other queries need spaCy,
+    and return empty filters if it is not installed. Install with:
       pip install spacy && python -m spacy download en_core_web_sm
+
+    Callers that already normalized the query pass it stripped together with q_lower (its lowercase form).
+    """
+    if q_lower is None:
+        query = query.strip() if query else ""
+        q_lower = query.lower()
+    if not query:
+        return _to_result(((), None))
+    return _to_result(_understand_query_cached(query, q_lower))
+
+
+def understand_queries(queries: list[str]) -> list[dict]:
+    """
+    Batch form of understand_query, for endpoints that parse many queries at once.
+    Queries the regex cannot answer go through nlp.pipe together, which amortizes spaCy's
+    per-call overhead. Results are in input order and have the same shape as understand_query.
+    """
+    parsed = [((), None)] * len(queries)
+    pending = []  # (position, stripped query, match) for queries that need spaCy
+    for i, query in enumerate(queries):
+        q = query.strip() if query else ""
+        if not q:
+            continue
+        match = _match_companies(q.lower())
+        fast = _fast_parse(match)
+        if fast is not None:
+            parsed[i] = fast
+        else:
+            pending.append((i, q, match))
+
+    nlp = _get_nlp() if pending else None
+    if nlp:
+        docs = nlp.pipe((q for _, q, _ in pending), batch_size=64)
+        for (i, _, match), doc in zip(pending, docs):
+            parsed[i] = _parse_doc(doc, match)
+    return [_to_result(p) for p in parsed]
+
+
+def _to_result(parsed: tuple) -> dict:
+    industry_keywords, location = parsed
+    return {
+        "industry_keywords": list(industry_keywords),
+        "location": location,
+        "residual_query": None,
+    }
+
+
+@lru_cache(maxsize=4096)
+def _understand_query_cached(query: str, q_lower: str) -> tuple:
+    """Memoized parse behind understand_query, keyed on the stripped query (q_lower is its lowercase form).
+    Case is kept in the key because spaCy NER relies on it. Returns (industry_keywords tuple, location)
+    so cached results are immutable.
     """
-    if not query or not query.strip():
-        return {"industry_keywords": [], "location": None, "residual_query": None}
+    match = _match_companies(q_lower)
+    fast = _fast_parse(match)
+    if fast is not None:
+        return fast
 
     nlp = _get_nlp()
-    if nlp is None:
-        return {"industry_keywords": [], "location": None, "residual_query": None}
+    if not nlp:
+        return (), None
+    return _parse_doc(nlp(query), match)
+
+
+def _match_companies(q_lower: str) -> tuple:
+    """Apply _COMPANIES_RE. Returns (match or None, normalized industry part, its known keywords or None)."""
+    m = _COMPANIES_RE.search(q_lower)
+    industry_part = _normalize(m.group(1)) if m else ""
+    known_keywords = _known_industry(industry_part) if industry_part and industry_part != "all" else None
+    return m, industry_part, known_keywords
+
 
-    doc = nlp(query.strip())
-    industry_keywords = []
+def _fast_parse(match: tuple) -> Optional[tuple]:
+    """
+    "<industry> companies [in <place>]": the regex alone is enough when the industry is known
+    and the location is spelled out. Returns None when spaCy is needed.
+    """
+    m, industry_part, known_keywords = match
+    if m and m.group(2) and (known_keywords is not None or industry_part == "all"):
+        return known_keywords or (), _normalize(m.group(2))
+    return None
+
+
+def _parse_doc(doc, match: tuple) -> tuple:
+    """spaCy half of the parse: location from NER, industry from lemmas or noun chunks."""
+    m, industry_part, known_keywords = match
+    industry_keywords = ()
     location = None
 
     # 1) Extract location from named entities (GPE, LOC, FAC)
@@ -106,32 +216,26 @@ def understand_query(query: Optional[str]) -> dict:
         if len(locations) > 1:
             location = " ".join(_normalize(l) for l in locations[:2])
 
-    # 2) Find industry: token(s) before "companies", lemmatized for better matching
-    q_lower = query.lower()
-    m = re.search(r"^(.+?)\s+companies?\s+(?:in\s+.+)?$", q_lower)
+    # 2) Find industry: token(s) before "companies", lemmatized when the term itself is unknown
     if m:
-        industry_part = _normalize(m.group(1))
         if industry_part and industry_part != "all":
-            industry_keywords = _expand_industry(industry_part)
-            if not industry_keywords:
+            industry_keywords = known_keywords
+            if industry_keywords is None:
                 for token in doc:
                     if token.text.lower() in industry_part.split():
                         lemma = token.lemma_.lower()
                         if lemma and lemma not in ("company", "companies"):
-                            industry_keywords = _expand_industry(lemma)
+                            industry_keywords = _known_industry(lemma)
                             break
+            if industry_keywords is None:
+                industry_keywords = _expand_industry(industry_part)
     else:
         # No "X companies" pattern: use noun chunks as industry hint
-        skip = ("company", "companies", "california", "india", "new york", "york")
         for np in doc.noun_chunks:
             root = np.root.text.lower()
-            if root not in skip:
+            if root not in _NOUN_CHUNK_SKIP:
                 industry_keywords = _expand_industry(root)
                 if industry_keywords:
                     break
 
-    return {
-        "industry_keywords": industry_keywords,
-        "location": location,
-        "residual_query": None,
-    }
+    return tuple(industry_keywords), location
@@ -2,6 +2,7 @@
 Multi-country and locale support for Part Three (Going global).
 Maps country codes/names to normalized index values and optional per-country indices.
 """
+from functools import lru_cache
 from typing import Optional
 
 # Normalize user input (code or name) -> canonical value stored in index (lowercase country name)
@@ -99,6 +100,7 @@ SUPPORTED_REGIONS = [
 ]
 
 
+@lru_cache(maxsize=256)
 def normalize_country(country_scope: Optional[str]) -> Optional[str]:
     """Normalize country_scope (code or name) to canonical value used in the index."""
     if not country_scope or not country_scope.strip():
@@ -3,25 +3,69 @@ OpenSearch search and facets for the company index.
 Supports query understanding, semantic matching, and multi-country (Part Three).
 """
 import os
-from typing import Optional, List
+from functools import lru_cache
+from typing import Optional, List, Tuple
 
-from opensearchpy import OpenSearch
+from opensearchpy import AsyncOpenSearch
 
 from query_understanding import understand_query
 from regions import normalize_country, get_index_suffix_for_country
 
 INDEX_NAME = "company"
 INDEX_PATTERN_ENV = "OPENSEARCH_INDEX_PER_COUNTRY"  # when set, use company_{suffix} per country
+_INDEX_PER_COUNTRY = bool(os.getenv(INDEX_PATTERN_ENV))  # read once at import
+# Keep-alive connections per OpenSearch node for one worker; aiohttp's default of 10 caps in-flight searches
+POOL_MAXSIZE = 64
 
+# Static parts of every search body, built once and shared (the client only serializes them).
+_AGGS = {
+    "industries": {"terms": {"field": "industry.keyword", "size": 100}},
+    "countries": {"terms": {"field": "country", "size": 100}},
+    "size_ranges": {"terms": {"field": "size_range", "size": 20}},
+    "year_range": {
+        "stats": {"field": "year_founded"},
+    },
+}
+_SORT_SPECS = {
+    "name_asc": [{"name.keyword": "asc"}],
+    "name_desc": [{"name.keyword": "desc"}],
+    "size_desc": [{"current_employee_estimate": "desc"}, "_score"],
+    "size_asc": [{"current_employee_estimate": "asc"}, "_score"],
+    "year_desc": [{"year_founded": "desc"}, "_score"],
+    "year_asc": [{"year_founded": "asc"}, "_score"],
+}
+_DEFAULT_SORT = ["_score"]  # relevance
 
-def get_client(host: str, user: str, password: str) -> OpenSearch:
-    return OpenSearch(
+# Locale language prefixes that group thousands with "." (de-DE: 1.000); all others use "," (en-US: 1,000)
+_DOT_THOUSANDS_LANGS = frozenset(("de", "fr", "pt", "es"))
+
+# _source fields copied into each API hit after its id, in response order
+_HIT_FIELDS = (
+    "name",
+    "domain",
+    "industry",
+    "size_range",
+    "locality",
+    "country",
+    "year_founded",
+    "current_employee_estimate",
+    "total_employee_estimate",
+    "linkedin_url",
+)
+
+
+def get_client(host: str, user: str, password: str) -> AsyncOpenSearch:
+    return AsyncOpenSearch(
         hosts=[host],
         http_compress=True,
         use_ssl=True,
         verify_certs=False,
         ssl_show_warn=False,
         http_auth=(user, password),
+        maxsize=POOL_MAXSIZE,
+        timeout=10,
+        retry_on_timeout=True,
+        max_retries=2,
     )
 
 
@@ -45,6 +89,8 @@ def build_search_body(
     country_scope: restrict results to one country (localized view); normalized via regions.
     """
     must = []
+    # Normalize the query once; understanding and the free-text match both use this form
+    q = query.strip() if query else ""
     # Part Three: country_scope for localized search (normalize code/name -> index value)
     effective_country = country
     if country_scope and country is None:
@@ -53,18 +99,18 @@ def build_search_body(
     # Query understanding: parse natural language into filters when no explicit filters given
     parsed_industry_keywords = []
     parsed_location = None
-    if use_query_understanding and query and query.strip():
-        understood = understand_query(query)
+    if use_query_understanding and q:
+        understood = understand_query(q, q_lower=q.lower())
         if understood["industry_keywords"] and industry is None:
             parsed_industry_keywords = understood["industry_keywords"]
         if understood["location"] and country is None and locality is None:
             parsed_location = understood["location"]
 
     # Free-text search (original query still used for name/industry/domain/locality match)
-    if query and query.strip():
+    if q:
         must.append({
             "multi_match": {
-                "query": query.strip(),
+                "query": q,
                 "fields": ["name^2", "industry", "domain", "locality", "country"],
                 "type": "best_fields",
                 "fuzziness": "AUTO",
@@ -113,49 +159,26 @@ def build_search_body(
 
     bool_query = {"bool": {"must": must}} if must else {"match_all": {}}
 
-    # Sort
-    if sort == "name_asc":
-        sort_spec = [{"name.keyword": "asc"}]
-    elif sort == "name_desc":
-        sort_spec = [{"name.keyword": "desc"}]
-    elif sort == "size_desc":
-        sort_spec = [{"current_employee_estimate": "desc"}, "_score"]
-    elif sort == "size_asc":
-        sort_spec = [{"current_employee_estimate": "asc"}, "_score"]
-    elif sort == "year_desc":
-        sort_spec = [{"year_founded": "desc"}, "_score"]
-    elif sort == "year_asc":
-        sort_spec = [{"year_founded": "asc"}, "_score"]
-    else:
-        sort_spec = ["_score"]
-
-    from_idx = (page - 1) * size
-
-    body = {
+    return {
         "query": bool_query,
-        "from": from_idx,
+        "from": (page - 1) * size,
         "size": size,
-        "sort": sort_spec,
-        "aggs": {
-            "industries": {"terms": {"field": "industry.keyword", "size": 100}},
-            "countries": {"terms": {"field": "country", "size": 100}},
-            "size_ranges": {"terms": {"field": "size_range", "size": 20}},
-            "year_range": {
-                "stats": {"field": "year_founded"},
-            },
-        },
+        "sort": _SORT_SPECS.get(sort, _DEFAULT_SORT),
+        "aggs": _AGGS,
     }
-    return body
 
 
+@lru_cache(maxsize=256)
 def resolve_search_indices(
     country_scope: Optional[str] = None,
-    indices: Optional[List[str]] = None,
+    indices: Optional[Tuple[str, ...]] = None,
 ) -> str:
-    """Resolve which index/indices to search. Returns index name or comma-separated list."""
+    """Resolve which index/indices to search. Returns index name or comma-separated list.
+    Memoized, so indices must be passed as a tuple.
+    """
     if indices:
         return ",".join(indices)
-    if os.getenv(INDEX_PATTERN_ENV) and country_scope:
+    if _INDEX_PER_COUNTRY and country_scope:
         canonical = normalize_country(country_scope)
         suffix = get_index_suffix_for_country(canonical) if canonical else None
         if suffix:
@@ -163,8 +186,8 @@ def resolve_search_indices(
     return INDEX_NAME
 
 
-def search(
-    client: OpenSearch,
+async def search(
+    client: AsyncOpenSearch,
     body: dict,
     index: Optional[str] = None,
     indices: Optional[List[str]] = None,
@@ -173,25 +196,14 @@ def search(
     """Execute search. Use index or resolve from indices/country_scope."""
     target = index
     if target is None:
-        target = resolve_search_indices(country_scope=country_scope, indices=indices)
-    resp = client.search(index=target, body=body)
+        target = resolve_search_indices(
+            country_scope=country_scope,
+            indices=tuple(indices) if indices else None,
+        )
+    resp = await client.search(index=target, body=body)
     return resp
 
 
-def _format_number_by_locale(value: Optional[int], locale: Optional[str]) -> Optional[str]:
-    """Format integer for display by locale (e.g. en-US: 1000 -> 1,000; de-DE: 1.000)."""
-    if value is None:
-        return None
-    if not locale:
-        return str(value)
-    try:
-        if locale.startswith("de") or locale.startswith("fr") or locale.startswith("pt") or locale.startswith("es"):
-            return f"{value:,}".replace(",", ".")
-        return f"{value:,}"
-    except Exception:
-        return str(value)
-
-
 def _regional_employee_value(
     src: dict,
     field: str,
@@ -210,6 +222,20 @@ def _regional_employee_value(
     return src.get(field)
 
 
+def _buckets(aggs: dict, name: str) -> list[dict]:
+    """Terms aggregation buckets as facet values: [{value, count}, ...]."""
+    return [{"value": b["key"], "count": b["doc_count"]} for b in (aggs.get(name) or {}).get("buckets", ())]
+
+
+def _hit_id(h: dict, src: dict):
+    """Company id of a hit, as an int like the CSV id. The ingest stores it only as the document
+    _id (always a string); indices loaded before that also kept it in _source."""
+    if "id" in src:
+        return src["id"]
+    doc_id = h.get("_id")
+    return int(doc_id) if doc_id is not None and doc_id.isdigit() else doc_id
+
+
 def parse_response(
     resp: dict,
     locale: Optional[str] = None,
@@ -225,38 +251,35 @@ def parse_response(
     if country_scope:
         canonical = normalize_country(country_scope)
         region_suffix = get_index_suffix_for_country(canonical) if canonical else None
+    # Number formatting depends only on the locale, so pick the separator once per response
+    thousands_sep = "." if locale and locale[:2] in _DOT_THOUSANDS_LANGS else ","
     hits = []
     for h in resp["hits"].get("hits", []):
         src = h.get("_source", {})
-        current_emp = _regional_employee_value(src, "current_employee_estimate", region_suffix)
-        total_emp = _regional_employee_value(src, "total_employee_estimate", region_suffix)
-        hit = {
-            "id": src.get("id"),
-            "name": src.get("name"),
-            "domain": src.get("domain"),
-            "industry": src.get("industry"),
-            "size_range": src.get("size_range"),
-            "locality": src.get("locality"),
-            "country": src.get("country"),
-            "year_founded": src.get("year_founded"),
-            "current_employee_estimate": current_emp,
-            "total_employee_estimate": total_emp,
-            "linkedin_url": src.get("linkedin_url"),
-        }
+        hit = {"id": _hit_id(h, src), **{k: src.get(k) for k in _HIT_FIELDS}}
+        if region_suffix:
+            hit["current_employee_estimate"] = _regional_employee_value(
+                src, "current_employee_estimate", region_suffix
+            )
+            hit["total_employee_estimate"] = _regional_employee_value(
+                src, "total_employee_estimate", region_suffix
+            )
         if locale:
-            hit["current_employee_estimate_formatted"] = _format_number_by_locale(
-                current_emp, locale
+            current_emp = hit["current_employee_estimate"]
+            total_emp = hit["total_employee_estimate"]
+            hit["current_employee_estimate_formatted"] = (
+                f"{current_emp:,}".replace(",", thousands_sep) if current_emp is not None else None
             )
-            hit["total_employee_estimate_formatted"] = _format_number_by_locale(
-                total_emp, locale
+            hit["total_employee_estimate_formatted"] = (
+                f"{total_emp:,}".replace(",", thousands_sep) if total_emp is not None else None
             )
         hits.append(hit)
 
     aggs = resp.get("aggregations") or {}
     facets = {
-        "industry": [{"value": b["key"], "count": b["doc_count"]} for b in aggs.get("industries", {}).get("buckets", [])],
-        "country": [{"value": b["key"], "count": b["doc_count"]} for b in aggs.get("countries", {}).get("buckets", [])],
-        "size_range": [{"value": b["key"], "count": b["doc_count"]} for b in aggs.get("size_ranges", {}).get("buckets", [])],
+        "industry": _buckets(aggs, "industries"),
+        "country": _buckets(aggs, "countries"),
+        "size_range": _buckets(aggs, "size_ranges"),
         "year": {},
     }
     yr = aggs.get("year_range", {})
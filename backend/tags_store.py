@@ -1,56 +1,152 @@
 """
 Simple file-based store for user tags (saved filter lists).
+Each user's tags live in their own JSON shard under data/tags/, so a request only reads or
+rewrites that user's file. File I/O goes through aiofiles so the async endpoints never block
+the event loop. Writes take an flock on the shard's lock file, so it is safe with multiple uvicorn workers.
+Tags from the old single-file store (data/tags.json) are split into shards on first use.
 """
-import json
+import asyncio
+import fcntl
+import hashlib
+import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
-STORAGE_PATH = Path(__file__).resolve().parent / "data" / "tags.json"
+import aiofiles
+import aiofiles.os
+import orjson
 
+STORAGE_DIR = Path(__file__).resolve().parent / "data" / "tags"
+# Pre-sharding store: {user_id: [tag, ...]} in one file, renamed to tags.json.migrated once split
+LEGACY_PATH = STORAGE_DIR.parent / "tags.json"
+LEGACY_LOCK_PATH = LEGACY_PATH.with_suffix(".json.lock")
 
-def _ensure_storage():
-    STORAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if not STORAGE_PATH.exists():
-        STORAGE_PATH.write_text("{}")
+# Serializes read-modify-write cycles; concurrent requests would otherwise drop each other's updates
+_write_lock = asyncio.Lock()
 
+# Parsed shards keyed by path -> ((st_ino, st_mtime_ns, st_size), tags). Every save swaps in a new
+# file, so the inode changes even when two writes land in one timestamp tick with the same size.
+# Cached lists are shared between callers and must not be mutated.
+_cache: dict[Path, tuple[tuple[int, int, int], list[dict]]] = {}
 
-def _load() -> dict:
-    _ensure_storage()
-    return json.loads(STORAGE_PATH.read_text())
+# Set once this process has checked for (and migrated) the legacy file
+_migrated = False
 
 
-def _save(data: dict) -> None:
-    _ensure_storage()
-    STORAGE_PATH.write_text(json.dumps(data, indent=2))
+def _shard_path(user_id: str) -> Path:
+    """Path of the user's tag shard. user_id comes from the URL, so hash it rather than use it as a filename."""
+    return STORAGE_DIR / f"{hashlib.sha256(user_id.encode('utf-8')).hexdigest()}.json"
 
 
-def get_tags(user_id: str) -> list[dict]:
-    data = _load()
-    return data.get(user_id, [])
+async def _ensure_storage():
+    await aiofiles.os.makedirs(STORAGE_DIR, exist_ok=True)
 
 
-def create_tag(user_id: str, name: str, filter_snapshot: Optional[dict] = None) -> dict:
-    data = _load()
-    if user_id not in data:
-        data[user_id] = []
+@asynccontextmanager
+async def _locked(path: Path):
+    """Hold the write lock within this process and an exclusive flock on the shard across worker processes."""
+    async with _write_lock:
+        await _ensure_storage()
+        fd = os.open(path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # flock blocks until the other worker is done; keep that off the event loop
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+async def _load(path: Path) -> list[dict]:
+    try:
+        st = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        return []
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    try:
+        async with aiofiles.open(path, "rb") as f:
+            tags = orjson.loads(await f.read())
+    except FileNotFoundError:
+        return []
+    _cache[path] = (key, tags)
+    return tags
+
+
+async def _save(path: Path, tags: list[dict]) -> None:
+    # Write to a temp file and swap it in so unlocked readers never see a half-written file
+    tmp_path = path.with_suffix(".tmp")
+    async with aiofiles.open(tmp_path, "wb") as f:
+        await f.write(orjson.dumps(tags))
+    st = await aiofiles.os.stat(tmp_path)
+    await aiofiles.os.replace(tmp_path, path)
+    _cache[path] = ((st.st_ino, st.st_mtime_ns, st.st_size), tags)
+
+
+async def _migrate_legacy() -> None:
+    """Split LEGACY_PATH into per-user shards, then rename it. Runs under the legacy file's flock
+    (the lock the old store used), so only one worker migrates and the others then find it gone.
+    """
+    global _migrated
+    if _migrated:
+        return
+    async with _write_lock:
+        if _migrated or not await aiofiles.os.path.exists(LEGACY_PATH):
+            _migrated = True
+            return
+        fd = os.open(LEGACY_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            if await aiofiles.os.path.exists(LEGACY_PATH):
+                async with aiofiles.open(LEGACY_PATH, "rb") as f:
+                    legacy = orjson.loads(await f.read())
+                await _ensure_storage()
+                for user_id, legacy_tags in legacy.items():
+                    path = _shard_path(user_id)
+                    tags = await _load(path)
+                    # Keep anything already in the shard; skip tags a previous partial run copied
+                    known = {t.get("id") for t in tags}
+                    await _save(path, [*tags, *(t for t in legacy_tags if t.get("id") not in known)])
+                await aiofiles.os.replace(LEGACY_PATH, LEGACY_PATH.with_suffix(".json.migrated"))
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        _migrated = True
+
+
+async def get_tags(user_id: str) -> list[dict]:
+    await _migrate_legacy()
+    return await _load(_shard_path(user_id))
+
+
+async def create_tag(user_id: str, name: str, filter_snapshot: Optional[dict] = None) -> dict:
+    path = _shard_path(user_id)
     tag = {
         "id": str(uuid4()),
         "name": name,
         "filter_snapshot": filter_snapshot or {},
     }
-    data[user_id].append(tag)
-    _save(data)
+    await _migrate_legacy()
+    async with _locked(path):
+        tags = await _load(path)
+        await _save(path, [*tags, tag])
     return tag
 
 
-def delete_tag(user_id: str, tag_id: str) -> bool:
-    data = _load()
-    if user_id not in data:
+async def delete_tag(user_id: str, tag_id: str) -> bool:
+    await _migrate_legacy()
+    path = _shard_path(user_id)
+    # user_id comes from the URL: don't create a lock file for users who have no tags
+    if not await aiofiles.os.path.exists(path):
         return False
-    before = len(data[user_id])
-    data[user_id] = [t for t in data[user_id] if t.get("id") != tag_id]
-    if len(data[user_id]) < before:
-        _save(data)
-        return True
-    return False
+    async with _locked(path):
+        tags = await _load(path)
+        remaining = [t for t in tags if t.get("id") != tag_id]
+        if len(remaining) == len(tags):
+            return False
+        await _save(path, remaining)
+    return True
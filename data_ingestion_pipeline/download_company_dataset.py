@@ -19,6 +19,7 @@ from pathlib import Path
 SCRIPT_DIR = Path(__file__).resolve().parent
 DATASET = "peopledatalabssf/free-7-million-company-dataset"
 OUTPUT_CSV = SCRIPT_DIR / "companies_sorted.csv"
+COPY_BUFFER_SIZE = 8 * 1024 * 1024  # 8 MiB per read/write; shutil's default is 64 KiB on Linux
 
 
 def main() -> None:
@@ -53,8 +54,9 @@ def main() -> None:
         # Use largest CSV if multiple
         csv_name = max(names, key=lambda n: z.getinfo(n).file_size)
         with z.open(csv_name) as src:
+            # Buffered writer: blocks this large pass straight through, and it retries short writes
             with open(OUTPUT_CSV, "wb") as dst:
-                shutil.copyfileobj(src, dst)
+                shutil.copyfileobj(src, dst, length=COPY_BUFFER_SIZE)
 
     zip_path.unlink()
     print(f"Done. CSV saved to {OUTPUT_CSV}")
@@ -6,18 +6,35 @@ Safe for large files (e.g. 1+ GB). Keeps the repo light: do not commit the CSV.
   - Override: set env COMPANY_CSV_PATH to a full path (e.g. after downloading via
     data_ingestion_pipeline/download_company_dataset.py from Kaggle).
 
+The CSV is split into line-aligned byte ranges, one per worker process. Each worker
+parses its range with pyarrow's multithreaded streaming reader, pruned to the columns
+that are indexed, and sends its own bulk requests.
+
 Supports regional employee counts: optional CSV columns
 "current employee estimate <suffix>" and "total employee estimate <suffix>"
 (e.g. "current employee estimate us", "total employee estimate de") for
 each region suffix (us, in, br, de, jp, ar, ...). See backend/regions.py.
 """
+import csv
 import os
 import sys
+import threading
+from multiprocessing import Pool
+from functools import lru_cache
 from pathlib import Path
+from queue import Queue
+from typing import Iterator, Optional
+from urllib.parse import urlparse
 
-import pandas as pd
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
 from dotenv import load_dotenv
 from opensearchpy import OpenSearch
+from opensearchpy.exceptions import SerializationError
+from opensearchpy.helpers import streaming_bulk
+from opensearchpy.serializer import JSONSerializer
+from pyarrow import csv as pacsv
 
 # Allow importing backend.regions
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -25,9 +42,14 @@ from backend.regions import COUNTRY_INDEX_SUFFIX
 
 load_dotenv()
 
-REGION_SUFFIXES = set(COUNTRY_INDEX_SUFFIX.values())
+REGION_SUFFIXES = frozenset(COUNTRY_INDEX_SUFFIX.values())
 
 OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "https://localhost:9201")
+# Gzipping bulk bodies only pays off over a real network; on loopback it is pure client CPU
+# (hosts may be given without a scheme, e.g. "localhost:9201"; urlparse needs the "//" to find the host)
+OPENSEARCH_IS_LOCAL = urlparse(
+    OPENSEARCH_HOST if "//" in OPENSEARCH_HOST else f"//{OPENSEARCH_HOST}"
+).hostname in ("localhost", "127.0.0.1", "::1")
 OPENSEARCH_USER = os.getenv("OPENSEARCH_USER", "admin")
 OPENSEARCH_PASSWORD = os.getenv(
     "OPENSEARCH_INITIAL_ADMIN_PASSWORD",
@@ -53,148 +75,326 @@ COLUMN_MAP = {
     "current employee estimate": "current_employee_estimate",
     "total employee estimate": "total_employee_estimate",
 }
+INDEX_FIELDS = frozenset(COLUMN_MAP.values())
+# Index fields stored as integers (regional employee columns are integers too); everything else is text
+INT_FIELDS = ("year_founded", "current_employee_estimate", "total_employee_estimate")
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 CSV_PATH = os.getenv("COMPANY_CSV_PATH") or str(SCRIPT_DIR / "companies_sorted.csv")
 CSV_PATH = Path(CSV_PATH)
 INDEX_NAME = "company"
-CHUNK_SIZE = 10_000  # rows per chunk to limit memory use
+CSV_BLOCK_SIZE = 8 * 1024 * 1024  # bytes of CSV parsed per batch; bounds memory use
+CSV_PREFETCH_BATCHES = 2  # parsed batches buffered ahead of doc building
+
+# Worker processes, each with its own client and one bulk request in flight. The default is
+# sized for the single-node docker-compose cluster; raise it for larger clusters.
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", "2"))
+# Byte ranges per worker process; more, smaller ranges mean more frequent progress updates
+RANGES_PER_PROCESS = 16
+
+# Documents rejected with 429 (cluster busy) are re-sent with exponential backoff this many times
+BULK_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+BULK_CHUNK_SIZE = 1_000  # docs per bulk request...
+BULK_MAX_BYTES = 50 * 1024 * 1024  # ...unless the request body reaches this size first
+
+# Index settings applied for the duration of the load: no periodic refreshes, no replicas to
+# keep in sync, and fewer translog flushes. The previous values are restored afterwards.
+BULK_LOAD_SETTINGS = {
+    "index.refresh_interval": "-1",
+    "index.number_of_replicas": "0",
+    "index.translog.flush_threshold_size": "1gb",
+}
+
+
+def regional_field(c) -> Optional[tuple[str, str]]:
+    """(by-region field, region suffix) for optional regional employee columns, e.g.
+    "current employee estimate us" -> ("current_employee_estimate_by_region", "us"); None otherwise.
+    """
+    if not isinstance(c, str):
+        return None
+    parts = c.split()
+    if len(parts) < 4:
+        return None
+    suffix = parts[-1].lower()
+    if suffix not in REGION_SUFFIXES:
+        return None
+    if c.startswith("current employee estimate "):
+        return "current_employee_estimate_by_region", suffix
+    if c.startswith("total employee estimate "):
+        return "total_employee_estimate_by_region", suffix
+    return None
+
+
+@lru_cache(maxsize=1)
+def _csv_layout() -> tuple[list[str], dict, dict]:
+    """Classify the CSV header once per process; every byte range and batch reuses it.
+    Returns (names of all CSV columns, {column to read: Arrow type}, {regional column: (field, suffix)}).
+    """
+    with open(CSV_PATH, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f))
+    names = [COLUMN_MAP.get(c, c) for c in header]
+    if "id" not in names:
+        # No recognizable id header; the first column holds the id
+        names[0] = "id"
+    # Optional regional employee columns (e.g. "current employee estimate us")
+    regional = {n: field for n in names if (field := regional_field(n)) is not None}
+    # Mapped columns + regional columns, all read as text: a strict numeric type would fail the
+    # whole batch on one bad cell, so numbers are coerced per column in _gen_docs instead
+    column_types = {n: pa.string() for n in names if n in INDEX_FIELDS or n in regional}
+    return names, column_types, regional
+
+
+def _byte_ranges(parts: int) -> list[tuple[int, int]]:
+    """Split CSV_PATH after the header into up to `parts` (start, end) byte ranges that begin
+    and end on row boundaries. Quoted fields may contain newlines, so a newline only ends a row
+    when an even number of quote characters precedes it (escaped quotes come in pairs).
+    The file is scanned once, in CSV_BLOCK_SIZE blocks.
+    """
+    size = CSV_PATH.stat().st_size
+    with open(CSV_PATH, "rb") as f:
+        f.readline()  # header
+        bounds = [f.tell()]
+        data_size = size - bounds[0]
+        targets = iter([bounds[0] + data_size * i // parts for i in range(1, parts)] + [size])
+        target = next(targets)
+        block_start = bounds[0]
+        quotes = 0  # quote characters before block_start
+        while target < size and (block := f.read(CSV_BLOCK_SIZE)):
+            pos = max(target - block_start, 0)
+            while target < size and (i := block.find(b"\n", pos)) != -1:
+                pos = i + 1
+                if (quotes + block.count(b'"', 0, i)) % 2:
+                    continue  # newline inside a quoted value
+                bounds.append(block_start + pos)
+                while target < bounds[-1]:
+                    target = next(targets)
+                pos = max(target - block_start, pos)
+            quotes += block.count(b'"')
+            block_start += len(block)
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
 
 
-def _row_to_doc(row: pd.Series, id_col: str) -> dict:
-    """Convert a DataFrame row to an index document with native Python types."""
-    doc = {}
-    for k, v in row.items():
-        if pd.isna(v):
-            doc[k] = None
-        elif isinstance(v, (int, float, str)) and not isinstance(v, bool):
-            doc[k] = v
+def _open_csv(start: int, end: int):
+    """Open bytes [start, end) of CSV_PATH as a stream of Arrow record batches holding only the columns we index,
+    already named by index field, so batches need no per-chunk renaming or filtering. Every
+    column gets an explicit type: the streaming reader would otherwise infer types from the
+    first block and fail on later blocks that don't fit.
+    """
+    names, column_types, _regional = _csv_layout()
+    # Zero-copy view of the range through a memory map
+    with pa.memory_map(str(CSV_PATH)) as mm:
+        mm.seek(start)
+        data = mm.read_buffer(end - start)
+    return pacsv.open_csv(
+        pa.BufferReader(data),
+        read_options=pacsv.ReadOptions(
+            column_names=names,
+            block_size=CSV_BLOCK_SIZE,
+            use_threads=True,
+        ),
+        # Quoted values may span lines; without this a row split across a block boundary fails to parse
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=list(column_types),
+            column_types=column_types,
+            null_values=[""],
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def _prefetch(iterable, depth: int) -> Iterator:
+    """Run `iterable` on a producer thread, buffering up to `depth` items ahead of the consumer.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    q = Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                q.put(item)
+        except BaseException as e:
+            q.put(e)
         else:
-            try:
-                doc[k] = int(v)
-            except (TypeError, ValueError):
-                try:
-                    doc[k] = float(v)
-                except (TypeError, ValueError):
-                    doc[k] = str(v) if v is not None else None
-    # Ensure id is set for _id (might come from first column)
-    if "id" not in doc and id_col in row.index:
-        val = row[id_col]
-        doc["id"] = int(val) if not pd.isna(val) else None
-    return doc
+            q.put(done)
 
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := q.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
 
-def main() -> None:
-    client = OpenSearch(
+
+# Plain decimal numbers; pandas-written CSVs store nullable ints as "1990.0"
+NUMBER_RE = r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$"
+
+
+def _to_int64(col: pa.Array) -> pa.Array:
+    """Parse a text column as integers. Cells that aren't numbers (e.g. "unknown", "n/a") become
+    null, like pd.to_numeric(errors="coerce"); fractions are truncated."""
+    col = pc.utf8_trim_whitespace(col)
+    col = pc.if_else(pc.match_substring_regex(col, NUMBER_RE), col, pa.scalar(None, pa.string()))
+    return col.cast(pa.float64()).cast(pa.int64(), safe=False)
+
+
+def _gen_docs(start: int, end: int) -> Iterator[tuple[int, dict]]:
+    """Read bytes [start, end) of the CSV in batches and yield (id, document) per company row.
+    The id is only used as the document _id; it is not repeated in the document.
+    """
+    _names, _column_types, regional = _csv_layout()
+    # Arrow parses the next batches (without the GIL) while this one is turned into docs
+    for batch in _prefetch(_open_csv(start, end), CSV_PREFETCH_BATCHES):
+        # Rows without a usable id are skipped
+        ids = _to_int64(batch.column("id"))
+        has_id = pc.is_valid(ids)
+        batch = batch.filter(has_id)
+        ids = ids.filter(has_id).to_pylist()
+
+        # Each column becomes one Python list (nulls -> None); the integer parsing happens on the
+        # Arrow arrays. Missing or unparseable years and employee counts stay missing.
+        columns = {}
+        for name, col in zip(batch.schema.names, batch.columns):
+            if name == "id" or name in regional:
+                continue
+            if name in INT_FIELDS:
+                col = _to_int64(col)
+            columns[name] = col.to_pylist()
+
+        # Regional employee columns -> per-row {suffix: count} dicts, built column by column
+        by_region = {}
+        for col, (field, suffix) in regional.items():
+            rows = by_region.get(field)
+            if rows is None:
+                rows = by_region[field] = [{} for _ in range(batch.num_rows)]
+            for regions, val in zip(rows, _to_int64(batch.column(col)).to_pylist()):
+                if val is not None:
+                    regions[suffix] = val
+
+        # Rows are assembled by zipping the column lists; null fields are left out
+        names = list(columns)
+        docs = [
+            {name: val for name, val in zip(names, row) if val is not None}
+            for row in zip(*columns.values())
+        ]
+        for field, rows in by_region.items():
+            for doc, regions in zip(docs, rows):
+                if regions:
+                    doc[field] = regions
+
+        yield from zip(ids, docs)
+
+
+def _expand_doc(item: tuple[int, dict]) -> tuple[dict, dict]:
+    """Bulk action/data lines for an (id, document) pair. Replaces the helpers' expand_action,
+    which copies every doc to strip metadata keys; ours carry none, and the index is set per request."""
+    doc_id, doc = item
+    return {"index": {"_id": doc_id}}, doc
+
+
+class ORJSONSerializer(JSONSerializer):
+    """JSONSerializer backed by orjson, which encodes numpy scalars natively; anything else
+    orjson can't encode falls back to JSONSerializer.default."""
+
+    def loads(self, s):
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(s, e)
+
+    def dumps(self, data):
+        # don't serialize strings
+        if isinstance(data, str):
+            return data
+        try:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError as e:
+            raise SerializationError(data, e)
+
+
+def _make_client() -> OpenSearch:
+    return OpenSearch(
         hosts=[OPENSEARCH_HOST],
-        http_compress=True,
+        serializer=ORJSONSerializer(),
+        http_compress=not OPENSEARCH_IS_LOCAL,
         use_ssl=True,
         verify_certs=False,
         ssl_show_warn=False,
         http_auth=(OPENSEARCH_USER, OPENSEARCH_PASSWORD),
+        timeout=120,
+        retry_on_timeout=True,
+        max_retries=3,
     )
 
+
+def _index_range(byte_range: tuple[int, int]) -> tuple[int, int]:
+    """Worker: index one byte range of the CSV. Returns (indexed, errors)."""
+    # Clients hold sockets, which must not be shared across processes
+    client = _make_client()
+    indexed = 0
+    errors = 0
+    for ok, _item in streaming_bulk(
+        client,
+        _gen_docs(*byte_range),
+        expand_action_callback=_expand_doc,
+        chunk_size=BULK_CHUNK_SIZE,
+        max_chunk_bytes=BULK_MAX_BYTES,
+        raise_on_error=False,
+        max_retries=BULK_MAX_RETRIES,
+        initial_backoff=2,
+        max_backoff=60,
+        index=INDEX_NAME,
+    ):
+        if ok:
+            indexed += 1
+        else:
+            errors += 1
+    return indexed, errors
+
+
+def _apply_bulk_load_settings(client: OpenSearch) -> dict:
+    """Switch the index to BULK_LOAD_SETTINGS and return the settings they replace."""
+    if not client.indices.exists(index=INDEX_NAME):
+        # Same as the index bulk would auto-create, but it must exist to take settings
+        client.indices.create(index=INDEX_NAME)
+    current = client.indices.get_settings(
+        index=INDEX_NAME, name=list(BULK_LOAD_SETTINGS), flat_settings=True
+    )[INDEX_NAME].get("settings", {})
+    # Settings that weren't set explicitly are restored as None, which resets them to the default
+    # (an explicit refresh_interval, even "1s", would turn off search-idle refresh skipping)
+    previous = {k: current.get(k) for k in BULK_LOAD_SETTINGS}
+    client.indices.put_settings(index=INDEX_NAME, body=BULK_LOAD_SETTINGS)
+    return previous
+
+
+def main() -> None:
     if not CSV_PATH.exists():
         raise SystemExit(f"CSV file not found: {CSV_PATH}")
 
     total_indexed = 0
     total_errors = 0
 
-    for chunk in pd.read_csv(CSV_PATH, chunksize=CHUNK_SIZE):
-        # Normalize column names to index field names
-        chunk = chunk.rename(columns=COLUMN_MAP)
-        # Keep mapped columns + optional regional employee columns (e.g. "current employee estimate us")
-        def is_regional_col(c):
-            if not isinstance(c, str):
-                return False
-            parts = c.split()
-            if len(parts) < 4:
-                return False
-            suffix = parts[-1].lower()
-            return (
-                (c.startswith("current employee estimate ") and suffix in REGION_SUFFIXES)
-                or (c.startswith("total employee estimate ") and suffix in REGION_SUFFIXES)
-            )
-        valid_cols = [c for c in chunk.columns if c in COLUMN_MAP.values() or is_regional_col(c)]
-        chunk = chunk[[c for c in valid_cols if c in chunk.columns]]
-        if "id" not in chunk.columns:
-            # First column may still be unnamed after rename; use first col as id
-            chunk = chunk.rename(columns={chunk.columns[0]: "id"})
-        chunk = chunk.dropna(subset=["id"])
-
-        # Types
-        chunk["id"] = pd.to_numeric(chunk["id"], errors="coerce").fillna(0).astype("int64")
-        for col in ("year_founded", "current_employee_estimate", "total_employee_estimate"):
-            if col in chunk.columns:
-                chunk[col] = pd.to_numeric(chunk[col], errors="coerce").fillna(0).astype("int64")
-
-        records = chunk.to_dict(orient="records")
-        # Clean types for JSON serialization
-        for r in records:
-            for k, v in list(r.items()):
-                if pd.isna(v):
-                    r[k] = None
-                elif not isinstance(v, (int, float, str)) or isinstance(v, bool):
-                    try:
-                        r[k] = int(v)
-                    except (TypeError, ValueError):
-                        try:
-                            r[k] = float(v)
-                        except (TypeError, ValueError):
-                            r[k] = str(v) if v is not None else None
-
-        bulk_body = []
-        for doc in records:
-            doc_id = doc.get("id")
-            if doc_id is None:
-                continue
-            # Build regional employee fields from optional columns
-            current_by_region = {}
-            total_by_region = {}
-            to_remove = []
-            for key, val in doc.items():
-                if not isinstance(key, str) or val is None or (isinstance(val, float) and pd.isna(val)):
-                    continue
-                parts = key.split()
-                if len(parts) < 4:
-                    continue
-                suffix = parts[-1].lower()
-                if suffix not in REGION_SUFFIXES:
-                    continue
-                try:
-                    ival = int(val)
-                except (TypeError, ValueError):
-                    continue
-                if key.startswith("current employee estimate "):
-                    current_by_region[suffix] = ival
-                    to_remove.append(key)
-                elif key.startswith("total employee estimate "):
-                    total_by_region[suffix] = ival
-                    to_remove.append(key)
-            for k in to_remove:
-                doc.pop(k, None)
-            if current_by_region:
-                doc["current_employee_estimate_by_region"] = current_by_region
-            if total_by_region:
-                doc["total_employee_estimate_by_region"] = total_by_region
-            bulk_body.append({"index": {"_index": INDEX_NAME, "_id": doc_id}})
-            bulk_body.append(doc)
-
-        if not bulk_body:
-            continue
-
-        resp = client.bulk(body=bulk_body, refresh=False)
-        if resp.get("errors"):
-            failed = sum(1 for i in resp.get("items", []) if "error" in i.get("index", {}))
-            total_errors += failed
-        total_indexed += len(records)
-        print(f"  Indexed {total_indexed} rows so far...", end="\r", flush=True)
-
-    # Optional: refresh index once at the end so new docs are searchable
+    client = _make_client()
+    previous_settings = _apply_bulk_load_settings(client)
+    try:
+        ranges = _byte_ranges(INGEST_PROCESSES * RANGES_PER_PROCESS)
+        with Pool(processes=min(INGEST_PROCESSES, len(ranges)) or 1) as pool:
+            for indexed, errors in pool.imap_unordered(_index_range, ranges):
+                total_indexed += indexed
+                total_errors += errors
+                print(f"  Indexed {total_indexed} rows so far...", end="\r", flush=True)
+    finally:
+        # Restore the original settings even if the load fails, so the index isn't left unreplicated
+        client.indices.put_settings(index=INDEX_NAME, body=previous_settings)
+
+    # Refresh once at the end so new docs are searchable, then merge the segments the load produced
     client.indices.refresh(index=INDEX_NAME)
+    client.indices.forcemerge(index=INDEX_NAME, max_num_segments=1, request_timeout=3600)  # can take minutes
     print(f"\nDone. Indexed {total_indexed} records into '{INDEX_NAME}'.")
     if total_errors:
-        print(f"  ({total_errors} items had errors)")
+        # Rejected even after retries: the index is incomplete, so fail the run
+        raise SystemExit(f"  ({total_errors} items had errors)")
 
 
 if __name__ == "__main__":
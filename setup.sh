@@ -133,7 +133,7 @@ trap cleanup INT TERM
 
 (
   cd backend
-  exec ../.venv/bin/uvicorn main:app --host 0.0.0.0 --port 8000
+  exec ../.venv/bin/uvicorn main:app --host 0.0.0.0 --port 8000 --loop uvloop
 ) &
 BACKEND_PID=$!
 